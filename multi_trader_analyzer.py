@@ -1,49 +1,117 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import re
 
-# Function to extract root symbol (e.g., NQZ5 → NQ)
-def extract_root_symbol(symbol):
-    return re.sub(r'\d+[A-Za-z]*$', '', symbol)
+# Strip $, commas and parentheses from pnl. Kept as a plain string: pandas only hands
+# string patterns to Arrow's regex kernel, a compiled one falls back to Python's re
+PNL_PATTERN = r'[\$,()]'
 
-# Function to clean and convert pnl values
+# Trailing contract digits and any letters after them (e.g., the 5 in NQZ5, the 24
+# in MNQM24), only run over the distinct symbols
+ROOT_SYMBOL_RE = re.compile(r'\d+[A-Za-z]*$')
+
+# Function to clean and convert a pnl column (e.g., $(1,234.50) → -1234.5)
 def clean_pnl(pnl):
-    if isinstance(pnl, str):
-        # Remove $ and commas
-        pnl = pnl.replace('$', '').replace(',', '')
-        # Check if the value is in parentheses (negative)
-        if '(' in pnl and ')' in pnl:
-            pnl = pnl.replace('(', '').replace(')', '')
-            return -float(pnl)
-        return float(pnl)
-    return pnl
+    if pd.api.types.is_numeric_dtype(pnl):
+        return pnl
+    # Values in parentheses are negative
+    negative = pnl.str.contains('(', regex=False, na=False)
+    # Remove $, commas and parentheses
+    pnl = pnl.str.replace(PNL_PATTERN, '', regex=True).astype(float)
+    return pnl.where(~negative, -pnl)
 
-# Function to analyze a single trader's CSV
-def analyze_trader(trades):
-    # Extract root symbol
-    trades['Root Symbol'] = trades['symbol'].apply(extract_root_symbol)
+# Function to load and clean a trader's CSV, cached on the file contents
+@st.cache_data(show_spinner=False)
+def load_trades(file_bytes):
+    trades = pd.read_csv(
+        io.BytesIO(file_bytes),
+        engine='pyarrow',
+        dtype_backend='pyarrow',
+        dtype={'symbol': 'string[pyarrow]', 'pnl': 'string[pyarrow]', 'qty': 'int32[pyarrow]'},
+        parse_dates=['boughtTimestamp', 'soldTimestamp']
+    )
     
-    # Clean pnl column
-    trades['pnl'] = trades['pnl'].apply(clean_pnl)
+    # Extract root symbol (e.g., NQZ5 → NQZ) once per distinct contract and keep
+    # it categorical so the per-asset aggregates work on integer codes
+    symbols = trades['symbol'].astype('category')
+    roots = symbols.cat.categories.str.replace(ROOT_SYMBOL_RE, '', regex=True)
+    root_codes, root_symbols = pd.factorize(roots, sort=True)
+    # Missing symbols have code -1, which picks the appended -1 (missing) root code
+    trades['Root Symbol'] = pd.Categorical.from_codes(
+        np.append(root_codes, -1)[symbols.cat.codes.to_numpy()],
+        categories=root_symbols
+    )
     
+    # Clean pnl column
+    trades['pnl'] = clean_pnl(trades['pnl'])
+    return trades
+
+# Function to sum values per integer group code, with each group's value count
+# (NaN values are skipped, like pandas' groupby aggregates)
+def group_sum(codes, values, n_groups):
+    present = ~np.isnan(values)
+    codes, values = codes[present], values[present]
+    return np.bincount(codes, weights=values, minlength=n_groups), np.bincount(codes, minlength=n_groups)
+
+# Function to average values per integer group code (NaN for empty groups)
+def group_mean(codes, values, n_groups):
+    sums, counts = group_sum(codes, values, n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+# Function to average the group totals over the non-empty groups
+def mean_group_total(codes, values, n_groups):
+    sums, counts = group_sum(codes, values, n_groups)
+    totals = sums[counts > 0]
+    return totals.mean() if len(totals) else np.nan
+
+# Function to analyze a single trader's cleaned trades
+def analyze_trader(trades):
     # Calculate account age (in days)
     first_trade_date = trades['boughtTimestamp'].min()
     last_trade_date = trades['boughtTimestamp'].max()
     account_age = (last_trade_date - first_trade_date).days
     
+    pnl = trades['pnl'].to_numpy(dtype=float, na_value=np.nan)
+    is_loss = pnl < 0
+    is_win = pnl > 0
+    
+    # Per-asset averages from the symbol's category codes
+    assets = trades['Root Symbol'].cat.categories
+    codes = trades['Root Symbol'].cat.codes.to_numpy()
+    qty = trades['qty'].to_numpy(dtype=float, na_value=np.nan)
+    known = codes >= 0
+    loss = known & is_loss
+    win = known & is_win
+    per_asset = pd.DataFrame({
+        'avg_loss': group_mean(codes[loss], pnl[loss], len(assets)),
+        'avg_win': group_mean(codes[win], pnl[win], len(assets)),
+        'avg_size': group_mean(codes[known], qty[known], len(assets))
+    }, index=assets.rename('Root Symbol'))
+    
+    # Winning/losing day totals from the trade date codes
+    days, dates = pd.factorize(trades['boughtTimestamp'].to_numpy().astype('datetime64[D]'))
+    dated = days >= 0
+    loss = dated & is_loss
+    win = dated & is_win
+    
     # Calculate metrics
     metrics = {
-        'Avg Loss per Asset': trades[trades['pnl'] < 0].groupby('Root Symbol')['pnl'].mean().to_dict(),
-        'Avg Win per Asset': trades[trades['pnl'] > 0].groupby('Root Symbol')['pnl'].mean().to_dict(),
-        'Avg Size per Trade per Asset': trades.groupby('Root Symbol')['qty'].mean().to_dict(),
-        'Winning Days': trades[trades['pnl'] > 0].groupby(trades['boughtTimestamp'].dt.date)['pnl'].sum().mean(),
-        'Losing Days': trades[trades['pnl'] < 0].groupby(trades['boughtTimestamp'].dt.date)['pnl'].sum().mean(),
+        'per_asset': per_asset,
+        'Winning Days': mean_group_total(days[win], pnl[win], len(dates)),
+        'Losing Days': mean_group_total(days[loss], pnl[loss], len(dates)),
         'Account Age': account_age
     }
     return metrics
 
+# Function to load (parsed once per distinct file across reruns) and analyze a trader's CSV
+def process_file(file_bytes):
+    return analyze_trader(load_trades(file_bytes))
+
 # Streamlit App
 def main():
     st.title("Multi-Trader Performance Analyzer")
@@ -53,52 +121,29 @@ def main():
     uploaded_files = st.file_uploader("Upload CSV files", type=["csv"], accept_multiple_files=True)
     if uploaded_files:
         all_metrics = []
-        for uploaded_file in uploaded_files:
-            try:
-                # Load CSV
-                trades = pd.read_csv(uploaded_file, parse_dates=['boughtTimestamp', 'soldTimestamp'])
-                
-                # Analyze trader
-                metrics = analyze_trader(trades)
-                all_metrics.append(metrics)
-            except Exception as e:
-                st.error(f"Error processing {uploaded_file.name}: {str(e)}")
+        # Load and analyze files in parallel threads (Arrow and pandas release the GIL)
+        with ThreadPoolExecutor(max_workers=min(8, len(uploaded_files))) as executor:
+            futures = [executor.submit(process_file, f.getvalue()) for f in uploaded_files]
+            for uploaded_file, future in zip(uploaded_files, futures):
+                try:
+                    all_metrics.append(future.result())
+                except Exception as e:
+                    st.error(f"Error processing {uploaded_file.name}: {str(e)}")
         
         if all_metrics:
             # Aggregate metrics across all traders
             aggregated = {
-                'Avg Loss per Asset': {},
-                'Avg Win per Asset': {},
-                'Avg Size per Trade per Asset': {},
                 'Avg Winning Days': np.mean([m['Winning Days'] for m in all_metrics if not np.isnan(m['Winning Days'])]),
                 'Avg Losing Days': np.mean([m['Losing Days'] for m in all_metrics if not np.isnan(m['Losing Days'])]),
                 'Avg Account Age': np.mean([m['Account Age'] for m in all_metrics])
             }
             
-            # Combine metrics for each asset
-            for metrics in all_metrics:
-                for asset, loss in metrics['Avg Loss per Asset'].items():
-                    if asset not in aggregated['Avg Loss per Asset']:
-                        aggregated['Avg Loss per Asset'][asset] = []
-                    aggregated['Avg Loss per Asset'][asset].append(loss)
-                
-                for asset, win in metrics['Avg Win per Asset'].items():
-                    if asset not in aggregated['Avg Win per Asset']:
-                        aggregated['Avg Win per Asset'][asset] = []
-                    aggregated['Avg Win per Asset'][asset].append(win)
-                
-                for asset, size in metrics['Avg Size per Trade per Asset'].items():
-                    if asset not in aggregated['Avg Size per Trade per Asset']:
-                        aggregated['Avg Size per Trade per Asset'][asset] = []
-                    aggregated['Avg Size per Trade per Asset'][asset].append(size)
-            
-            # Calculate averages for each asset
-            for asset in aggregated['Avg Loss per Asset']:
-                aggregated['Avg Loss per Asset'][asset] = np.mean(aggregated['Avg Loss per Asset'][asset])
-            for asset in aggregated['Avg Win per Asset']:
-                aggregated['Avg Win per Asset'][asset] = np.mean(aggregated['Avg Win per Asset'][asset])
-            for asset in aggregated['Avg Size per Trade per Asset']:
-                aggregated['Avg Size per Trade per Asset'][asset] = np.mean(aggregated['Avg Size per Trade per Asset'][asset])
+            # Average the per-asset metrics across traders in one groupby
+            combined = pd.concat([m['per_asset'] for m in all_metrics])
+            per_asset = combined.groupby(level=0, observed=True).mean()
+            aggregated['Avg Loss per Asset'] = per_asset['avg_loss'].dropna()
+            aggregated['Avg Win per Asset'] = per_asset['avg_win'].dropna()
+            aggregated['Avg Size per Trade per Asset'] = per_asset['avg_size']
             
             # Display results
             st.header("Aggregated Analysis")
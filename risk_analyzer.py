@@ -1,41 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import streamlit as st
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
 import plotly.express as px
 
 # Configure page
 st.set_page_config(page_title="Bonus Risk Analyzer", layout="wide")
 st.title("Incentive Program Risk Calculator")
 
+# Strip $, commas and parentheses from pnl (compiled by Arrow's regex kernel)
+PNL_PATTERN = r'[\$,()]'
+
+# Timestamp layout of standard trade exports
+TIMESTAMP_FORMAT = '%m/%d/%Y %H:%M:%S'
+
+# Sums over days whose PnL is all missing are 0, as in pandas
+SUM_OPTIONS = pc.ScalarAggregateOptions(min_count=0)
+
+def sold_dates(timestamps):
+    """Parse sold timestamps to dates, using Arrow's strptime for the standard export format"""
+    try:
+        return pc.cast(pc.strptime(timestamps, format=TIMESTAMP_FORMAT, unit='s'), pa.date32())
+    except pa.ArrowInvalid:
+        # Any other layout falls back to pandas' format inference
+        dates = pd.to_datetime(timestamps.to_pandas()).to_numpy().astype('datetime64[D]')
+        return pa.array(dates, from_pandas=True)
+
+@st.cache_data(show_spinner=False)
+def load_daily_pnl(file_bytes):
+    """Stream a trader CSV into its max position size and PnL per sold date, cached on the file contents"""
+    # Only parse the columns the analysis uses, one 8 MB block at a time
+    reader = pv.open_csv(
+        pa.BufferReader(file_bytes),
+        read_options=pv.ReadOptions(block_size=8 << 20),
+        convert_options=pv.ConvertOptions(
+            include_columns=['qty', 'buyPrice', 'pnl', 'soldTimestamp'],
+            column_types={'qty': pa.int32(), 'buyPrice': pa.float64(),
+                          'pnl': pa.string(), 'soldTimestamp': pa.string()},
+            # Blank cells are missing values, as with pd.read_csv
+            strings_can_be_null=True
+        )
+    )
+    
+    position_sizes = []
+    daily = []
+    for batch in reader:
+        # Clean PnL and calculate metrics with Arrow compute on the block's buffers
+        # (padding such as '$ 12.50' is trimmed, as float() would accept it)
+        pnl = pc.utf8_trim_whitespace(pc.replace_substring_regex(batch['pnl'], pattern=PNL_PATTERN, replacement=''))
+        pnl = pc.cast(pnl, pa.float64())
+        position_sizes.append(pc.max(pc.multiply(batch['qty'], batch['buyPrice'])).as_py())
+        
+        # Partial PnL sums per sold date for this block
+        block = pa.table({'soldDate': sold_dates(batch['soldTimestamp']), 'pnl': pnl})
+        block = block.filter(pc.is_valid(block['soldDate']))
+        daily.append(block.group_by('soldDate').aggregate([('pnl', 'sum', SUM_OPTIONS)]))
+    
+    # A header-only CSV has no blocks: no balance estimate and no trading days
+    if not daily:
+        return np.nan, np.array([])
+    
+    # Estimate starting balance (max position size, skipping blocks with no
+    # complete qty/buyPrice pair) and merge days split across blocks
+    initial_balance = max((p for p in position_sizes if p is not None), default=np.nan)
+    daily = pa.concat_tables(daily).group_by('soldDate').aggregate([('pnl_sum', 'sum', SUM_OPTIONS)])
+    daily_pnl = daily['pnl_sum_sum'].to_numpy()
+    return initial_balance, daily_pnl
+
+def qualify(daily_pnl, initial_balance, min_days, daily_threshold, total_threshold):
+    """Check a trader's daily PnL against the program targets"""
+    required_daily_profit = initial_balance * daily_threshold
+    valid_days = int((daily_pnl >= required_daily_profit).sum())
+    
+    total_profit = daily_pnl.sum()
+    qualifies = (
+        valid_days >= min_days and 
+        total_profit >= initial_balance * total_threshold
+    )
+    return {'valid_days': valid_days, 'total_profit': total_profit, 'qualifies': qualifies}
+
 def analyze_trader(file, min_days=7, daily_threshold=0.04, total_threshold=0.5):
     """Analyze individual trader CSV and calculate bonus risk"""
     try:
-        df = pd.read_csv(file)
-        
-        # Clean PnL and calculate metrics
-        df['pnl'] = df['pnl'].str.replace('[$,()]', '', regex=True).astype(float)
-        df['soldDate'] = pd.to_datetime(df['soldTimestamp']).dt.date
-        
-        # Estimate starting balance (max position size)
-        df['position_size'] = df['qty'] * df['buyPrice']
-        initial_balance = df['position_size'].max()
-        
-        # Daily performance analysis
-        daily = df.groupby('soldDate').agg(
-            daily_pnl=('pnl', 'sum'),
-            trades=('pnl', 'count')
-        ).reset_index()
+        # Parsing is cached per file, so slider changes only rerun the scalar checks below
+        initial_balance, daily_pnl = load_daily_pnl(file.getvalue())
         
         # Calculate qualification metrics
-        required_daily_profit = initial_balance * daily_threshold
-        daily['met_target'] = daily['daily_pnl'] >= required_daily_profit
-        valid_days = daily[daily['met_target']]
-        
-        total_profit = daily['daily_pnl'].sum()
-        qualifies = (
-            len(valid_days) >= min_days and 
-            total_profit >= initial_balance * total_threshold
-        )
+        targets = qualify(daily_pnl, initial_balance, min_days, daily_threshold, total_threshold)
+        total_profit = targets['total_profit']
+        qualifies = targets['qualifies']
         
         # Calculate company exposure
         if qualifies:
@@ -79,12 +135,22 @@ if uploaded_files:
     results = []
     progress_bar = st.progress(0)
     
-    # Process all files
-    for i, file in enumerate(uploaded_files):
+    # Parse files in parallel threads (Arrow and pandas release the GIL); results
+    # land in load_daily_pnl's cache, so analyze_trader below only reads them back
+    with ThreadPoolExecutor(max_workers=min(8, len(uploaded_files))) as executor:
+        futures = {executor.submit(load_daily_pnl, file.getvalue()): file for file in uploaded_files}
+        for i, _ in enumerate(as_completed(futures)):
+            progress_bar.progress((i+1)/len(uploaded_files))
+    
+    # Process all files; failed parses aren't cached, so report them here
+    # rather than letting analyze_trader parse them a second time
+    for future, file in futures.items():
+        if future.exception() is not None:
+            st.error(f"Error analyzing {file.name}: {str(future.exception())}")
+            continue
         result = analyze_trader(file, min_profit_days, daily_profit_target, total_profit_target)
         if result:
             results.append(result)
-        progress_bar.progress((i+1)/len(uploaded_files))
     
     if results:
         df = pd.DataFrame(results)